@@ -1,52 +1,287 @@
-from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Tuple, Iterable
+from functools import partial
+from types import MappingProxyType
+import sys, weakref
+
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError: # Non-str dict keys, stringified like json does. The option is slower, so only on demand
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    _loads = json.loads
+
+
+# -----------------------------
+# Serialized Keys
+# -----------------------------
+
+# Literal keys are interned by the compiler already, these make it explicit for every
+# place that builds or reads a serialized dict. Runtime strings (subclass types, extra
+# prop keys) are interned in JS_Component.
+_K_TYPE = sys.intern("type")
+_K_ID = sys.intern("id")
+_K_CLASSES = sys.intern("classes")
+_K_PROPS = sys.intern("props")
+_K_CHILDREN = sys.intern("children")
+_K_KEY = sys.intern("key")
+
+# Stands in for empty children until the first add, saves a list per component
+_EMPTY = ()
+
+# Component types by id, filled as component classes are declared. Used by FlatTree.
+_TYPES: List[str] = []
+_TYPE_IDS: Dict[str, int] = {}
+_TYPE_CLASSES: Dict[str, type] = {} # First class declared for each type
+
+
+# -----------------------------
+# Specialized Members
+# -----------------------------
+
+_SPECIALIZED: Dict[tuple, Dict[str, Any]] = {}
+
+
+def _generic(func: Callable) -> Callable:
+    """Marks a member that component subclasses get a generated, specialized version of."""
+    func._generic = True
+    return func
+
+
+def _specialize(prop_keys: tuple, container: bool) -> Dict[str, Any]:
+    """
+    Generates `props` and `serialize` for a component class with the given prop slots.
+
+    The generated code reads every slot by name into a dict literal, so building the
+    serialized dict needs no loop, getattr or super() call, and a cached component costs a
+    single call. Containers serialize their children recursively, each through its own
+    `serialize` so overrides are honoured. Prop keys are slot names and therefore valid
+    identifiers.
+    """
+    key = (prop_keys, container)
+    members = _SPECIALIZED.get(key)
+    if members is None:
+        fields = "".join(f"{k!r}: self.{k}, " for k in prop_keys)
+        props = f"({{{fields}}} if self.extra is None else {{{fields}**self.extra}})"
+        children = ", _K_CHILDREN: [child.serialize() for child in self.children]" if container else ""
+        namespace = {}
+        exec(
+            "def props(self):\n"
+            f"    return {props}\n"
+            "def serialize(self):\n"
+            "    cached = self._cached\n"
+            "    if cached is None:\n"
+            "        classes = self._classes\n"
+            "        if classes.__class__ is list:\n"
+            "            classes = ' '.join(reversed(classes))\n"
+            f"        cached = self._cached = {{_K_TYPE: self.type, _K_ID: self.id, _K_CLASSES: classes, _K_PROPS: {props}{children}}}\n"
+            "    return cached\n",
+            globals(),
+            namespace,
+        )
+        members = {}
+        for name, func in namespace.items():
+            _generic(func)
+            members[name] = func
+        members["props"] = property(members["props"], doc=JS_Component.props.__doc__)
+        _SPECIALIZED[key] = members
+    return members
 
 
 # -----------------------------
 # Base Component Classes
 # -----------------------------
 
-class JS_Component(ABC):
-    """Base class for all components."""
+class JS_Component:
+    """
+    Base class for all components.
+
+    Known props are stored in the slots listed by `_PROP_KEYS`; any other keyword argument is
+    kept in `extra` and serialized after them. `extra` is None rather than an empty dict when
+    there are none, which saves a dict per component.
+
+    Serialized output is cached per component, so treat the dicts returned by `serialize` as
+    read-only. The cache is dropped by `add_class` and `add`; call `invalidate` after assigning
+    a prop, `extra` or `classes` directly.
+
+    Classes are kept as given until the first `add_class`, then as a list of the given string
+    and the added names, newest last, joined newest first when read.
+    """
+
+    __slots__ = ("id", "_classes", "extra", "_cached", "_json", "_parent", "__weakref__")
 
     type: str = None # type: ignore
+    _PROP_KEYS: tuple = ()
+    _CONTAINER: bool = False
+    _OWN_SERIALIZE: bool = False # Set for classes overriding serialize, which the other encoders then defer to
+    _JSON_HEAD: bytes = b'{"type":null,"id":' # Prebuilt per class, the type never changes
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._JSON_HEAD = b'{"type":' + _dumps(cls.type) + b',"id":'
+        if cls.type is not None:
+            cls.type = sys.intern(cls.type)
+            if cls.type not in _TYPE_IDS:
+                _TYPE_IDS[cls.type] = len(_TYPES)
+                _TYPES.append(cls.type)
+                _TYPE_CLASSES[cls.type] = cls
+        cls._PROP_KEYS = tuple(map(sys.intern, cls._PROP_KEYS))
+
+        # Swap in specialized members unless the class, or a parent, wrote its own
+        for name, member in _specialize(cls._PROP_KEYS, cls._CONTAINER).items():
+            inherited = getattr(cls, name)
+            if getattr(getattr(inherited, "fget", inherited), "_generic", False):
+                setattr(cls, name, member)
+        cls._OWN_SERIALIZE = not getattr(cls.serialize, "_generic", False)
 
     def __init__(self, id: str, classes: str = None, **props):
         self.id = id
-        self.classes = classes
-        self.props = props
+        self._classes: str | List[str] = classes # Set directly, the setter costs a call per component
+        self.extra = {sys.intern(key): value for key, value in props.items()} if props else None
+        self._cached: Dict[str, Any] = None
+        self._json: bytes = None
+        self._parent: weakref.ref | List[weakref.ref] = None # A list once in more than one container
+
+    @property
+    def classes(self) -> str:
+        classes = self._classes
+        if classes.__class__ is list:
+            return " ".join(reversed(classes))
+        return classes
+
+    @classes.setter
+    def classes(self, classes: str):
+        self._classes: str | List[str] = classes
+
+    @property
+    @_generic
+    def props(self) -> Dict[str, Any]:
+        """The props as they will be serialized. A fresh dict, editing it has no effect."""
+        props = {key: getattr(self, key) for key in self._PROP_KEYS}
+        if self.extra is not None:
+            props.update(self.extra)
+        return props
 
     def add_class(self, class_name: str):
-        if self.classes:
-            self.classes = f"{class_name} {self.classes}"
-        else:
-            self.classes = class_name
+        classes = self._classes
+        if classes.__class__ is not list:
+            self._classes = classes = [classes] if classes else []
+        classes.append(class_name)
+        if self._cached is not None or self._json is not None: # Else no ancestor has a cache either
+            self.invalidate()
         return self
 
+    def invalidate(self):
+        """Drops the cached serialization of this component and of every ancestor."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._cached = None
+            node._json = None
+            parents = node._parent
+            if parents is None:
+                continue
+            for ref in parents if parents.__class__ is list else (parents,):
+                parent = ref()
+                # A parent without caches has no cached ancestors either, since caches are built bottom up
+                if parent is not None and (parent._cached is not None or parent._json is not None):
+                    stack.append(parent)
+        return self
+
+    def _adopt(self, children: "Iterable[JS_Component]"):
+        """Records this component as a parent of each child, alongside any it already has."""
+        ref = weakref.ref(self)
+        for child in children:
+            parents = child._parent
+            if parents is None or parents is ref:
+                child._parent = ref
+            elif parents.__class__ is list:
+                if ref not in parents:
+                    parents[:] = [parent for parent in parents if parent() is not None] # Shared leaves outlive many parents
+                    parents.append(ref)
+            elif parents() is None: # The previous parent is gone
+                child._parent = ref
+            else:
+                child._parent = [parents, ref]
+
+    @_generic
     def serialize(self) -> Dict[str, Any]:
-        return {
-            "type": self.type,
-            "id": self.id,
-            "classes": self.classes,
-            "props": self.props
-        }
+        if self._cached is None:
+            self._cached = {
+                _K_TYPE: self.type,
+                _K_ID: self.id,
+                _K_CLASSES: self.classes,
+                _K_PROPS: self.props,
+            }
+        return self._cached
+
+    def _json_children(self) -> bytes:
+        return b""
+
+    def to_json_bytes(self) -> bytes:
+        """Serializes straight to JSON without building the dict tree. Cached like `serialize`."""
+        if self._json is None:
+            if self._OWN_SERIALIZE:
+                self._json = _dumps(self.serialize())
+                return self._json
+            self._json = b"".join((
+                self._JSON_HEAD, _dumps(self.id),
+                b',"classes":', _dumps(self.classes),
+                b',"props":', _dumps(self.props),
+                self._json_children(),
+                b"}",
+            ))
+        return self._json
 
 
 class JS_Container(JS_Component):
     """Base class for components that may contain children."""
 
+    __slots__ = ("children",)
+
+    _CONTAINER = True
+
     def __init__(self, id: str, classes: str = None, children: List["JS_Component"] = None, **props):
         super().__init__(id=id, classes=classes, **props)
-        self.children = children or []
+        if children:
+            self.children = children
+            self._adopt(children)
+        else:
+            self.children = _EMPTY
 
     def add(self, *children: "JS_Component"):
+        self._adopt(children)
+        if self.children is _EMPTY:
+            self.children = []
         self.children.extend(children)
+        if self._cached is not None or self._json is not None: # Else no ancestor has a cache either
+            self.invalidate()
         return self
 
+    @_generic
     def serialize(self) -> Dict[str, Any]:
-        base = super().serialize()
-        base["children"] = [child.serialize() for child in self.children]
-        return base
+        if self._cached is None:
+            self._cached = {
+                _K_TYPE: self.type,
+                _K_ID: self.id,
+                _K_CLASSES: self.classes,
+                _K_PROPS: self.props,
+                _K_CHILDREN: [child.serialize() for child in self.children],
+            }
+        return self._cached
+
+    def _json_children(self) -> bytes:
+        return b',"children":[' + b",".join([child.to_json_bytes() for child in self.children]) + b"]"
 
 
 # -----------------------------
@@ -54,61 +289,195 @@ class JS_Container(JS_Component):
 # -----------------------------
 
 class JS_Div(JS_Container):
+    __slots__ = ()
     type = "div"
 
 
 class JS_Form(JS_Container):
+    __slots__ = ()
     type = "form"
 
 
 class JS_Section(JS_Container):
+    __slots__ = ()
     type = "section"
 
 
+# -----------------------------
+# Lazy Components
+# -----------------------------
+
+class JS_Lazy(JS_Component):
+    """
+    Renders `render_fn(**deps)` and reuses the result until a dependency changes identity.
+
+    The lazy node serializes as whatever `render_fn` returns plus a "key" entry holding `key`,
+    which is also its id and lets the consumer pair old and new renders. Keep the JS_Lazy instance around between renders and
+    pass new dependencies through `update`, the only way to change them: it also invalidates
+    the containers holding the lazy node.
+
+    `render_fn` must read its inputs from `deps` only: state captured by a closure or an
+    anonymous lambda is invisible to the identity check and will not trigger a re-render.
+    """
+
+    __slots__ = ("render_fn", "_deps")
+
+    type = "lazy"
+
+    def __init__(self, render_fn: Callable[..., JS_Component], key: str, **deps):
+        super().__init__(id=key)
+        self.render_fn = render_fn
+        self._deps = deps
+
+    @property
+    def deps(self) -> MappingProxyType:
+        """The current dependencies, read-only. Change them with `update`."""
+        return MappingProxyType(self._deps)
+
+    def update(self, **deps):
+        """Replaces the given dependencies, invalidating the render only if one of them changed identity."""
+        if any(self._deps.get(k, self) is not v for k, v in deps.items()):
+            self._deps = {**self._deps, **deps}
+            self.invalidate()
+        return self
+
+    def serialize(self) -> Dict[str, Any]:
+        if self._cached is None:
+            child = self.render_fn(**self._deps)
+            self._adopt((child,))
+            self._cached = {**child.serialize(), _K_KEY: self.id}
+        return self._cached
+
+    def to_json_bytes(self) -> bytes:
+        previous = self._cached
+        out = self.serialize()
+        if self._json is None or out is not previous:
+            self._json = _dumps(out)
+        return self._json
+
+
+# -----------------------------
+# Shared Leaves
+# -----------------------------
+
+# Frozen leaves handed out by `shared`, one per (class, id, text, classes)
+_INTERN: "weakref.WeakValueDictionary[tuple, JS_Component]" = weakref.WeakValueDictionary()
+
+# Cache bookkeeping that may still change on a frozen component
+_UNFROZEN = frozenset(("_cached", "_json", "_parent"))
+
+
+class _Frozen:
+    """Mixin of the classes shared instances are switched to, refuses assignments."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any):
+        if name not in _UNFROZEN:
+            raise AttributeError(f"{type(self).__name__} {self.id!r} is frozen")
+        object.__setattr__(self, name, value)
+
+    def add_class(self, class_name: str):
+        classes = self.classes
+        return self.shared(self.id, self.text, f"{class_name} {classes}" if classes else class_name)
+
+
+class _Flyweight:
+    """
+    Mixin for text leaves that are often repeated verbatim, adds the `shared` constructor.
+
+    Shared instances are frozen: assigning to them raises AttributeError and `add_class`
+    returns another shared instance instead of modifying this one, so always use its result.
+    Instances made through the regular constructor behave as usual, at full speed: only the
+    shared ones belong to the frozen subclass made for each flyweight class.
+    """
+
+    __slots__ = ()
+
+    _frozen_class: type = None
+    _thawed_class: type = None # Inherited unchanged by the frozen class
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not issubclass(cls, _Frozen):
+            cls._thawed_class = cls
+            cls._frozen_class = type(f"Shared{cls.__name__}", (_Frozen, cls), {"__slots__": (), "__module__": cls.__module__})
+
+    @classmethod
+    def shared(cls, id: str, text: str, classes: str = None):
+        thawed, frozen = cls._thawed_class, cls._frozen_class
+        key = (frozen, id, text, classes)
+        try:
+            component = _INTERN.get(key)
+        except TypeError: # Unhashable text
+            return thawed(id=id, text=text, classes=classes)
+        if component is None:
+            component = thawed(id=id, text=text, classes=classes)
+            component.__class__ = frozen # Built unfrozen, then frozen in place
+            _INTERN[key] = component
+        return component
+
+
 # -----------------------------
 # Leaf Components
 # -----------------------------
 
-class JS_Label(JS_Component):
+class JS_Label(_Flyweight, JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "label"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
 
 
 class JS_TextBox(JS_Component):
+    __slots__ = _PROP_KEYS = ("label", "hint")
     type = "input"
 
     def __init__(self, id: str, label: str, hint: str = "", classes: str = None, **props):
-        super().__init__(id=id, classes=classes, label=label, hint=hint, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.label = label
+        self.hint = hint
 
 
 class JS_Select(JS_Component):
+    __slots__ = _PROP_KEYS = ("label", "options")
     type = "select"
 
     def __init__(self, id: str, label: str, options: List[str], classes: str = None, **props):
-        super().__init__(id=id, classes=classes, label=label, options=options, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.label = label
+        self.options = options
 
 
 class JS_Checkbox(JS_Component):
+    __slots__ = _PROP_KEYS = ("label", "options")
     type = "checkbox"
 
     def __init__(self, id: str, label: str, options: List[str], classes: str = None, **props):
-        super().__init__(id=id, classes=classes, label=label, options=options, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.label = label
+        self.options = options
 
 
 class JS_Radio(JS_Component):
+    __slots__ = _PROP_KEYS = ("label", "options")
     type = "radio"
 
     def __init__(self, id: str, label: str, options: List[str], classes: str = None, **props):
-        super().__init__(id=id, classes=classes, label=label, options=options, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.label = label
+        self.options = options
 
 
-class JS_Button(JS_Component):
+class JS_Button(_Flyweight, JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "button"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
 
 
 # -----------------------------
@@ -116,60 +485,67 @@ class JS_Button(JS_Component):
 # -----------------------------
 
 class JS_H1(JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "h1"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
 
 class JS_H2(JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "h2"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
 
 
 class JS_H3(JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "h3"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
 
 class JS_H4(JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "h4"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
 
 class JS_H5(JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "h5"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
 
 class JS_H6(JS_Component):
+    __slots__ = _PROP_KEYS = ("text",)
     type = "h6"
 
     def __init__(self, id: str, text: str, classes: str = None, **props):
-        super().__init__(id=id, classes=classes, text=text, **props)
+        super().__init__(id=id, classes=classes, **props)
+        self.text = text
+
+# Indexed by header level, 0 doubles as the fallback for invalid levels
+_HEADINGS = (JS_H1, JS_H1, JS_H2, JS_H3, JS_H4, JS_H5, JS_H6)
 
 class JS_Header_Div(JS_Container):
+    __slots__ = ()
     type = "div"
 
     def __init__(self, id: str, header: str, header_level: int, child: JS_Component, header_classes: str = None, div_classes: str = None, **props):
-        c = f"headerDivDefault {div_classes}" 
-        super().__init__(id=id, classes=c, **props)
-
-        # Map header_level to the corresponding class
-        heading_class_map = {
-            1: JS_H1,
-            2: JS_H2,
-            3: JS_H3,
-            4: JS_H4,
-            5: JS_H5,
-            6: JS_H6,
-        }
+        super().__init__(id=id, classes=div_classes, **props)
+        self.add_class("headerDivDefault")
 
-        HeadingClass = heading_class_map.get(header_level, JS_H1)  # Default to H1 if invalid
+        # Map header_level to the corresponding class, default to H1 if invalid
+        HeadingClass = _HEADINGS[header_level if isinstance(header_level, int) and 1 <= header_level <= 6 else 0]
 
         # Create heading and label
         heading_component: JS_Component = HeadingClass(id=f"{id}_header", text=header)
@@ -179,20 +555,329 @@ class JS_Header_Div(JS_Container):
         self.add(heading_component, indented_child)
 
 
+# -----------------------------
+# Flat Trees
+# -----------------------------
+
+class FlatTree:
+    """
+    A component tree packed into parallel arrays, one entry per node in breadth-first order.
+
+    The children of node `i` are the contiguous entries `first_child[i]` to
+    `first_child[i] + n_children[i]`; `first_child[i]` is -1 for leaves. Every component is kept
+    as columns, serialized or not, except those with their own `serialize` such as JS_Lazy:
+    the columns cannot describe them, so they are stored whole in `cached`, not expanded, and
+    `lift` refuses them.
+    """
+
+    __slots__ = ("type_ids", "ids", "classes", "props", "first_child", "n_children", "cached")
+
+    def __init__(self):
+        self.type_ids: List[int] = []
+        self.ids: List[str] = []
+        self.classes: List[str] = []
+        self.props: List[Dict[str, Any]] = []
+        self.first_child: List[int] = []
+        self.n_children: List[int] = []
+        self.cached: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lift(self, index: int = 0) -> "JS_Component":
+        """Creates the component for entry `index` and its subtree, using the first class declared for each type."""
+        if self.cached[index] is not None:
+            raise ValueError(f"Entry {index} has its own serialize and cannot be lifted")
+
+        cls = _TYPE_CLASSES[_TYPES[self.type_ids[index]]]
+        component = cls(id=self.ids[index], classes=self.classes[index], **self.props[index])
+        first = self.first_child[index]
+        if first >= 0:
+            component.add(*[self.lift(i) for i in range(first, first + self.n_children[index])])
+        return component
+
+
+def flatten(root: JS_Component) -> FlatTree:
+    """Walks the tree once, breadth first, into a FlatTree."""
+    flat = FlatTree()
+    type_ids, ids, classes, props = flat.type_ids, flat.ids, flat.classes, flat.props
+    first_child, n_children, cached = flat.first_child, flat.n_children, flat.cached
+    type_table = _TYPE_IDS
+    container = JS_Container
+
+    queue = [root]
+    append = queue.append
+    head = 0
+    while head < len(queue):
+        node = queue[head]
+        head += 1
+
+        type_ids.append(type_table[node.__class__.type])
+        ids.append(node.id)
+        classes.append(node.classes)
+
+        # Only components with their own serialize are stored whole, the columns cannot describe them
+        done = node.serialize() if node._OWN_SERIALIZE else None
+        cached.append(done)
+        props.append(node.props if done is None else None)
+
+        if done is not None or not isinstance(node, container):
+            first_child.append(-1)
+            n_children.append(0)
+            continue
+
+        children = node.children
+        first_child.append(len(queue))
+        n_children.append(len(children))
+        for child in children:
+            append(child)
+
+    return flat
+
+
+def serialize_flat(flat: FlatTree) -> Dict[str, Any]:
+    """
+    Builds the same dict tree as `serialize` from a FlatTree.
+
+    Children always come after their parent, so a single reverse pass over the arrays
+    builds every node after all of its children, without recursion or method calls.
+    """
+    n = len(flat)
+    out = flat.cached[:]
+    types = _TYPES
+    type_ids, ids, classes, props = flat.type_ids, flat.ids, flat.classes, flat.props
+    first_child, n_children = flat.first_child, flat.n_children
+
+    for i in range(n - 1, -1, -1):
+        if out[i] is not None:
+            continue
+        node = {
+            _K_TYPE: types[type_ids[i]],
+            _K_ID: ids[i],
+            _K_CLASSES: classes[i],
+            _K_PROPS: props[i],
+        }
+        first = first_child[i]
+        if first >= 0:
+            node[_K_CHILDREN] = out[first:first + n_children[i]]
+        out[i] = node
+
+    return out[0] if n else None
+
+
+def flat_from_columns(
+        types: List[str],
+        parents: List[int],
+        ids: List[str],
+        props: List[Dict[str, Any]] = None,
+        classes: List[str] = None,
+    ) -> FlatTree:
+    """
+    Builds a FlatTree straight from columns, one row per node, without creating components.
+
+    Meant for forms generated from tabular data: serialize the result with `serialize_flat`,
+    or `lift` only the parts that need to be components.
+
+    Parameters
+    ----------
+    types : list[str]
+        The component type of each row, e.g. "div" or "input".
+    parents : list[int]
+        The row of each row's parent, -1 for the single root. Rows may come in any order,
+        siblings keep their relative order.
+    ids : list[str]
+        The id of each row.
+    props : list[dict], optional
+        The props of each row. Defaults to no props.
+    classes : list[str], optional
+        The classes of each row. Defaults to None.
+    """
+    n = len(ids)
+    children = [[] for _ in range(n)]
+    root = -1
+    for row, parent in enumerate(parents):
+        if parent >= 0:
+            children[parent].append(row)
+        elif root >= 0:
+            raise ValueError(f"Rows {root} and {row} are both roots")
+        else:
+            root = row
+    if root < 0:
+        raise ValueError("No root row")
+
+    flat = FlatTree()
+    type_ids, flat_ids, flat_classes, flat_props = flat.type_ids, flat.ids, flat.classes, flat.props
+    first_child, n_children, cached = flat.first_child, flat.n_children, flat.cached
+    type_table = _TYPE_IDS
+
+    order = [root]
+    head = 0
+    while head < len(order):
+        row = order[head]
+        head += 1
+
+        row_type = types[row]
+        type_ids.append(type_table[row_type])
+        flat_ids.append(ids[row])
+        flat_classes.append(classes[row] if classes is not None else None)
+        flat_props.append(props[row] if props is not None else {})
+        cached.append(None)
+
+        row_children = children[row]
+        if issubclass(_TYPE_CLASSES[row_type], JS_Container):
+            first_child.append(len(order))
+            n_children.append(len(row_children))
+            order.extend(row_children)
+        elif row_children:
+            raise ValueError(f"Row {row} has children but its type {row_type!r} is not a container")
+        else:
+            first_child.append(-1)
+            n_children.append(0)
+
+    if len(order) != n:
+        raise ValueError("Some rows are not reachable from the root")
+
+    return flat
+
+
 # -----------------------------
 # Page Wrapper
 # -----------------------------
 
 class JS_Page:
-    def __init__(self, title: str, prompt: str, form: bool, description: str, root: JS_Container, effects: dict = {}, presets: dict = {}):
+    """
+    A full page: metadata plus a root component.
+
+    `serialize` and `to_json_bytes` are cached until the root tree changes or an attribute is
+    reassigned. Call `invalidate` after editing `effects` or `presets` in place.
+
+    For pages re-sent with only a few values changing, `render` fills a compiled bytes
+    template instead. It reads prop values and page fields afresh on every call, so unlike
+    `to_json_bytes` it also picks up values assigned or edited without calling `invalidate`;
+    the two return the same JSON whenever the caches are current.
+    """
+
+    def __init__(self, title: str, prompt: str, form: bool, description: str, root: JS_Container, effects: dict = None, presets: dict = None):
         self.title = title
         self.description = description
         self.prompt = prompt
         self.form = form
         self.root = root
-        self.effects = effects
-        self.presets = presets
+        self.effects = effects if effects is not None else {}
+        self.presets = presets if presets is not None else {}
+        self._template: bytes = None
+        self._template_getters: List[Callable[[], Any]] = None
+        self._template_root: bytes = None
+
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        if name[0] != "_":
+            self.invalidate()
+
+    def invalidate(self):
+        self._cached: dict = None
+        self._json: bytes = None
+        self._json_root: bytes = None
+        return self
 
     def serialize(self):
-        return {"title": self.title, "description": self.description, "prompt": self.prompt, "form": self.form, "root": self.root.serialize(), "effects": self.effects, "presets": self.presets}
-
+        root = self.root.serialize()
+        cached = self._cached
+        if cached is None or cached["root"] is not root:
+            cached = self._cached = {"title": self.title, "description": self.description, "prompt": self.prompt, "form": self.form, "root": root, "effects": self.effects, "presets": self.presets}
+        return cached
+
+
+    def to_json_bytes(self) -> bytes:
+        if self.__class__.serialize is not JS_Page.serialize: # Must match what the override returns
+            return _dumps(self.serialize())
+        root = self.root.to_json_bytes()
+        if self._json is None or self._json_root is not root:
+            self._json_root = root
+            self._json = b"".join((
+                b'{"title":', _dumps(self.title),
+                b',"description":', _dumps(self.description),
+                b',"prompt":', _dumps(self.prompt),
+                b',"form":', _dumps(self.form),
+                b',"root":', root,
+                b',"effects":', _dumps(self.effects),
+                b',"presets":', _dumps(self.presets),
+                b"}",
+            ))
+        return self._json
+
+    def compile_template(self) -> Tuple[bytes, List[Callable[[], Any]]]:
+        """
+        Compiles the page into a bytes template with a `%b` slot for every value.
+
+        Types, ids, classes, prop keys and the tree shape are written literally. Page fields
+        and prop values become slots, each read by the matching getter. Lazy components, and
+        any other component with its own `serialize`, are a single slot holding its output.
+
+        Returns
+        -------
+        tuple[bytes, list[Callable]]
+            The template, and the getters for its slots in order.
+        """
+        parts: List[bytes] = []
+        getters: List[Callable[[], Any]] = []
+
+        def static(chunk: bytes):
+            parts.append(chunk.replace(b"%", b"%%"))
+
+        def slot(getter: Callable[[], Any]):
+            parts.append(b"%b")
+            getters.append(getter)
+
+        def emit(node: JS_Component):
+            if node._OWN_SERIALIZE: # Lazy components among them
+                slot(node.serialize)
+                return
+
+            static(node._JSON_HEAD + _dumps(node.id) + b',"classes":' + _dumps(node.classes) + b',"props":{')
+            separator = b""
+            for key in node._PROP_KEYS:
+                static(separator + _dumps(key) + b":")
+                slot(partial(getattr, node, key))
+                separator = b","
+            for key in node.extra or ():
+                static(separator + _dumps(key) + b":")
+                slot(partial(node.extra.__getitem__, key))
+                separator = b","
+            static(b"}")
+
+            if isinstance(node, JS_Container):
+                static(b',"children":[')
+                for i, child in enumerate(node.children):
+                    if i:
+                        static(b",")
+                    emit(child)
+                static(b"]")
+            static(b"}")
+
+        for i, field in enumerate(("title", "description", "prompt", "form")):
+            static((b'{"' if i == 0 else b',"') + field.encode() + b'":')
+            slot(partial(getattr, self, field))
+        static(b',"root":')
+        emit(self.root)
+        for field in ("effects", "presets"):
+            static(b',"' + field.encode() + b'":')
+            slot(partial(getattr, self, field))
+        static(b"}")
+
+        return b"".join(parts), getters
+
+    def render(self) -> bytes:
+        """
+        Returns the page as JSON by filling the compiled template with the current values.
+
+        Prop values and page fields are read on every call, including ones assigned without
+        `invalidate`, so the result matches `to_json_bytes` whenever its cache is current. The
+        structure, i.e. types, ids, classes and children, comes from the template, which is
+        recompiled after `add`, `add_class`, `invalidate` or a new `root`.
+        """
+        root = self.root
+        if self._template is None or root._json is None or root._json is not self._template_root:
+            self._template, self._template_getters = self.compile_template()
+            self._template_root = root.to_json_bytes()
+        return self._template % tuple([_dumps(getter()) for getter in self._template_getters])
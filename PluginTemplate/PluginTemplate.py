@@ -1,12 +1,112 @@
+from __future__ import annotations
 from abc import ABC, abstractmethod
 from OperaPowerRelay import opr
+from OperaPowerRelay.opr import print_from as _print_from, input_from as _input_from, error_pretty as _error_pretty
 from typing import Callable
-import os, sys
-root = os.path.dirname(os.path.abspath(__file__))
-if root not in sys.path:
-    sys.path.insert(0, root)
-import DSL
-import socket, json, struct
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field, fields
+try:
+    from . import DSL
+except ImportError: # Loaded as a top-level module, DSL sits next to it
+    import DSL
+import socket, struct, re, threading
+
+# Same JSON codec as the DSL: orjson when installed, compact stdlib json otherwise
+_dumps = DSL._dumps
+_loads = DSL._loads
+
+# Length prefix of a HUD frame
+_U32_BE = struct.Struct("!I")
+
+
+@dataclass(slots=True)
+class _PluginMeta(MutableMapping):
+    """
+    Metadata of a plugin, stored in slots.
+
+    Read it with attribute access. It is also a full mutable mapping, so plugins written
+    against the old dict keep working: keys other than the fields below are kept in `_extra`.
+
+    `commands` is the tuple of command_map keys, built once and kept until command_map is
+    assigned again. `mode_re`, the pattern finding any of them, is cached alongside and
+    recompiled only when that tuple is rebuilt. After editing command_map in place, assign it
+    again (`meta.command_map = meta.command_map`) so the commands are read anew.
+    """
+    name:               str
+    description:        str
+    prompt:             str = ""
+    needs_args:         bool = False
+    type_of_input:      str = "console"
+    command_map:        dict = field(default_factory=dict)
+    quick_commands:     dict = field(default_factory=dict)
+    help_text:          str = ""
+    access_level:       int = 0
+    git_repo:           str = ""
+    _commands:          tuple = field(default=None, init=False, repr=False, compare=False)
+    _mode_re:           tuple = field(default=None, init=False, repr=False, compare=False) # (commands, pattern)
+    _multiword:         tuple = field(default=None, init=False, repr=False, compare=False) # (commands, multi-word ones)
+    _extra:             dict = field(default_factory=dict, init=False, repr=False)
+
+    def __setattr__(self, name: str, value):
+        object.__setattr__(self, name, value)
+        if name == "command_map":
+            object.__setattr__(self, "_commands", None)
+
+    @property
+    def commands(self) -> tuple:
+        commands = self._commands
+        if commands is None:
+            commands = self._commands = tuple(self.command_map)
+        return commands
+
+    @property
+    def mode_re(self) -> re.Pattern | None:
+        """Matches any command, None when there are none."""
+        commands = self.commands
+        if self._mode_re is None or self._mode_re[0] is not commands:
+            # Longest command first, so a command that is a substring of another cannot shadow it
+            pattern = re.compile("|".join(map(re.escape, sorted(commands, key=len, reverse=True)))) if commands else None
+            self._mode_re = (commands, pattern)
+        return self._mode_re[1]
+
+    @property
+    def multiword_commands(self) -> tuple:
+        """The commands containing a space, longest first. Cached like `mode_re`."""
+        commands = self.commands
+        if self._multiword is None or self._multiword[0] is not commands:
+            self._multiword = (commands, tuple(sorted((c for c in commands if " " in c), key=len, reverse=True)))
+        return self._multiword[1]
+
+    def __getitem__(self, key: str):
+        if key in _META_FIELDS:
+            return getattr(self, key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value):
+        if key in _META_FIELDS:
+            setattr(self, key, value)
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in _META_FIELDS:
+            raise TypeError(f"Plugin metadata field {key!r} cannot be deleted")
+        del self._extra[key]
+
+    def __iter__(self):
+        yield from _META_FIELDS
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return len(_META_FIELDS) + len(self._extra)
+
+    def __contains__(self, key) -> bool:
+        return key in _META_FIELDS or key in self._extra
+
+
+# Keys served from _PluginMeta's fields, in declaration order
+_META_FIELDS = dict.fromkeys(f.name for f in fields(_PluginMeta) if f.init)
+
 
 class ophelia_plugin(ABC):
     """
@@ -33,8 +133,8 @@ class ophelia_plugin(ABC):
 
     Attributes
     ----------
-    _meta : dict
-        A dictionary containing metadata about the plugin.
+    _meta : _PluginMeta
+        The plugin's metadata, one attribute per parameter.
 
     Methods
     -------
@@ -51,6 +151,9 @@ class ophelia_plugin(ABC):
 
     
     """
+
+    __slots__ = ("_meta", "_cached_default_scheme", "_default_label", "__weakref__")
+
     def __init__(
             self, 
             name:               str, 
@@ -65,24 +168,35 @@ class ophelia_plugin(ABC):
             git_repo:           str = "",
         ):
 
-        self._meta: dict = {
-            "name":             name, 
-            "description":      description,
-            "prompt":           prompt,  
-            "needs_args":       needs_args,
-            "type_of_input":    type_of_input,
-            "command_map":      command_map or {}, 
-            "quick_commands":   quick_commands or {},
-            "help_text":        help_text, 
-            "access_level":     access_level,
-            "git_repo":         git_repo,
-        }
+        self._meta = _PluginMeta(
+            name=               name, 
+            description=        description,
+            prompt=             prompt,  
+            needs_args=         needs_args,
+            type_of_input=      type_of_input,
+            command_map=        command_map or {}, 
+            quick_commands=     quick_commands or {},
+            help_text=          help_text, 
+            access_level=       access_level,
+            git_repo=           git_repo,
+        )
+
+        self._cached_default_scheme: tuple = None # (metadata it was built from, serialized page)
+        self._default_label: tuple = None # (name it was built from, shared placeholder JS_Label)
+
+    @property
+    def meta_dict(self) -> dict:
+        """A plain dict copy of the metadata, for code that still expects the old dict form."""
+        return dict(self._meta)
     
 
-    def input_scheme(self, root: DSL.JS_Container = None, form: bool = None, serialize: bool = False, effects: dict = {}, presets: dict = {}):
+    def input_scheme(self, root: DSL.JS_Container = None, form: bool = None, serialize: bool = False, effects: dict = None, presets: dict = None):
         """
         Returns the input scheme for the plugin.
 
+        Every call returns a new page. With the defaults and `serialize`, the serialized page is
+        built once and reused until the plugin's metadata changes, so treat it as read-only.
+
         Parameters
         ----------
         serialize : bool, optional
@@ -94,24 +208,37 @@ class ophelia_plugin(ABC):
             The input scheme for the plugin.
         """
 
+        meta = self._meta
+        cache = serialize and root is None and form is None and not effects and not presets
+        if cache:
+            key = (meta.name, meta.description, meta.prompt, meta.needs_args)
+            if self._cached_default_scheme is not None and self._cached_default_scheme[0] == key:
+                return self._cached_default_scheme[1]
+
+        if root is None:
+            # The label is frozen and so reused across pages, the root stays fresh per page as callers may add to it
+            if self._default_label is None or self._default_label[0] != meta.name:
+                self._default_label = (meta.name, DSL.JS_Label.shared(
+                    id= f"{meta.name}_no_children",
+                    text= "No children",
+                ))
+            root = DSL.JS_Div(id= "root", children= [self._default_label[1]])
+
         scheme = DSL.JS_Page(
-            title= self._meta["name"],
-            description= self._meta["description"],
-            prompt= self._meta["prompt"],
-            form= form if form is not None else self._meta["needs_args"],
-            root= root or DSL.JS_Div(
-                id= "root",
-                children= [
-                    DSL.JS_Label(
-                        id= f"{self._meta['name']}_no_children",
-                        text= "No children",
-                    )
-                ]
-            ),        
+            title= meta.name,
+            description= meta.description,
+            prompt= meta.prompt,
+            form= form if form is not None else meta.needs_args,
+            root= root,
             effects= effects,
             presets= presets,
         )
-        return scheme.serialize() if serialize else scheme
+        if not serialize:
+            return scheme
+        serialized = scheme.serialize()
+        if cache:
+            self._cached_default_scheme = (key, serialized)
+        return serialized
 
 
     def prep_execute(self, input_callable: Callable = None, output_callable: Callable = None, *args, **kwargs) -> str | tuple[str, str] | None:  # type: ignore
@@ -148,46 +275,79 @@ class ophelia_plugin(ABC):
         - Gracefully handles interruptions (Ctrl+C) and input errors.
 
         """
+        meta = self._meta
+        name = meta.name
+        prompt = meta.prompt
+        needs_args = meta.needs_args
+
         if output_callable:
-            output_callable(self._meta["prompt"])
-        elif self._meta["prompt"] and not self._meta["needs_args"]:
-            opr.print_from(name=self._meta["name"], message=self._meta["prompt"], do_print=True)
+            output_callable(prompt)
+        elif prompt and not needs_args:
+            _print_from(name=name, message=prompt, do_print=True)
 
 
-        if self._meta["needs_args"]:
+        if needs_args:
 
             if input_callable: return input_callable(*args, **kwargs)
             
             else:
                 try:
-                    user_input: str = ""
-                    while True:
-                        if self._meta["prompt"]: print(self._meta["prompt"])
-                        user_input = opr.input_from(name=self._meta["name"], message="Input (Ctrl+C to cancel)", do_print=True)
-                        
-                        if self._meta["command_map"]:
-                            for mode in self._meta["command_map"].keys():
-                                if mode in user_input:
-                                    find = user_input.replace(mode, "").strip()
-                                    user_input = [find, mode]
-                                    break
-                            else: 
-                                opr.print_from(name=self._meta["name"], message="Mode not found. Query cancelled", do_print=True)
-                                return None
-
-                        break
+                    if prompt: print(prompt)
+                    user_input: str = _input_from(name=name, message="Input (Ctrl+C to cancel)", do_print=True)
 
+                    if meta.mode_re is None: # No command_map, nothing to split
+                        return user_input
+
+                    user_input = self._split_mode(user_input)
+                    if user_input is None:
+                        _print_from(name=name, message="Mode not found. Query cancelled", do_print=True)
                     return user_input
                 except KeyboardInterrupt:
                     return None
                 except EOFError: # Helps against accidental returns
                     pass
                 except Exception as e:
-                    opr.error_pretty(exc=e, name=self._meta["name"], message=f"Error in input function\n{e}", level="ERROR")
+                    _error_pretty(exc=e, name=name, message=f"Error in input function\n{e}", level="ERROR")
                     pass
 
         return None
 
+    def _split_mode(self, user_input: str) -> list[str] | None:
+        """
+        Splits an operational mode out of the user input.
+
+        A leading multi-word command is checked first, so it wins over its own first word. A
+        leading command word is then found with a single dict lookup and a trailing command with
+        one tail comparison per command. Only a command in the middle of the input falls back
+        to the precompiled scan.
+
+        Returns
+        -------
+        list[str] | None
+            [query, mode], or None if the input contains no mode.
+        """
+        meta = self._meta
+        multiword = meta.multiword_commands
+        if multiword and user_input.startswith(multiword):
+            mode = next(command for command in multiword if user_input.startswith(command))
+            return [user_input[len(mode):].strip(), mode]
+
+        head, _, rest = user_input.partition(" ")
+        if head in meta.command_map:
+            return [rest.strip(), head]
+
+        stripped = user_input.rstrip()
+        commands = meta.commands
+        if stripped.endswith(commands):
+            # Longest wins, in case one command is a suffix of another
+            mode = max((command for command in commands if stripped.endswith(command)), key=len)
+            return [stripped[:-len(mode)].rstrip(), mode]
+
+        match = meta.mode_re.search(user_input)
+        if match is None:
+            return None
+        return [(user_input[:match.start()] + user_input[match.end():]).strip(), match.group(0)]
+
     def run_command(self, command: str=None, *args, **kwargs):
 
         """
@@ -209,34 +369,36 @@ class ophelia_plugin(ABC):
         any
             The result of the command function, if applicable. Otherwise, None.
         """
-        commands = list(self._meta["command_map"].keys())
+        name = self._meta.name
+        command_map = self._meta.command_map
+        commands = self._meta.commands
 
 
         # If no command is pre-specified, ask user to select one
         if command is None:
-            opr.list_choices(choices=commands, title=f"Available commands for {self._meta['name']}")
-            raw = opr.input_from(
-                name=self._meta["name"],
+            # Written as one message rather than a line per command
+            listing = "\n".join(f"{i}. {cmd}" for i, cmd in enumerate(commands, 1))
+            _print_from(name=name, message=f"Available commands for {name}\n{listing}", do_print=True)
+            raw = _input_from(
+                name=name,
                 message=f"Select command (1 - {len(commands)}) or enter to cancel",
             )
 
             # Validate input
-            try:
-                choice = int(raw.strip())
-                if not 1 <= choice <= len(commands) or raw == "":
-                    raise ValueError
-                command = commands[choice - 1]
-            except ValueError as e:
-                opr.print_from(self._meta["name"], message=f"{self._meta['name']} command cancelled")
+            raw = raw.strip()
+            choice = int(raw) if raw.isdecimal() else 0
+            if not 1 <= choice <= len(commands):
+                _print_from(name, message=f"{name} command cancelled")
                 return None
+            command = commands[choice - 1]
 
 
         # Execute command if valid
-        func = self._meta["command_map"].get(command)
+        func = command_map.get(command)
         if func is None:
-            opr.error_pretty(
+            _error_pretty(
                 exc=None,
-                name=self._meta["name"],
+                name=name,
                 message=f"Unknown command: {command}",
                 level="INFO"
             )
@@ -269,7 +431,13 @@ class ophelia_plugin(ABC):
 
 
 
-class ophelia_envelope(ABC):
+class ophelia_envelope:
+    """
+    Wraps a page for sending to the HUD.
+
+    `export` and `export_bytes` are cached for as long as the page's own serialization is,
+    see DSL.JS_Page. Call `invalidate` after reassigning `page_title` or `page_data`.
+    """
 
     def __init__(
             self,
@@ -278,41 +446,67 @@ class ophelia_envelope(ABC):
         ):
         self.page_title = page_title
         self.page_data = page_data
+        self.invalidate()
+
+    def invalidate(self):
+        self._cached_export: dict = None
+        self._cached_bytes: tuple = None # (page bytes, envelope bytes)
+        return self
 
     def export(self) -> dict:
-        return {
-            "page_title": self.page_title,
-            "data": self.page_data.serialize(),
-        }
+        data = self.page_data.serialize()
+        if self._cached_export is None or self._cached_export["data"] is not data:
+            self._cached_export = {
+                "page_title": self.page_title,
+                "data": data,
+            }
+        return self._cached_export
+
+    def export_bytes(self) -> bytes:
+        """The JSON encoding of `export`, built from the page's own cached bytes."""
+        data = self.page_data.to_json_bytes()
+        if self._cached_bytes is None or self._cached_bytes[0] is not data:
+            envelope = b'{"page_title":' + _dumps(self.page_title) + b',"data":' + data + b"}"
+            self._cached_bytes = (data, envelope)
+        return self._cached_bytes[1]
 
 
 class ophelia_input():
 
-
-    types = [
-        "console",
-        "browser",
-        ]
-    
     HUD_HOST = "127.0.0.1"
     HUD_PORT = 6990
-    DEFAULT_BROWSER_PROMPT = DSL.JS_Page(
-            title= "Input Required",
-            description = "",
-            prompt = "",
-            form = True,
-            root= DSL.JS_Div(
-                id = "new-input-div",
-                children=[
-                    DSL.JS_TextBox(
-                        id = "generic_input",
-                        label = "Input",
-                        hint = "Input Required",
-                        type = "text",
-                        ),
-                    ]
+    HUD_TIMEOUT = 5*60 # 5 minutes, the user is answering on the other end
+
+    # Connection kept open between prompts, guarded by _hud_lock
+    _hud_sock: socket.socket | None = None
+    _hud_lock = threading.Lock()
+    # Built on first use by default_browser_prompt
+    _DEFAULT_BROWSER_PROMPT: DSL.JS_Page | None = None
+
+    @classmethod
+    def default_browser_prompt(cls) -> DSL.JS_Page:
+        """
+        Returns the generic single textbox page browser_input shows when no prompt is given.
+        """
+        if cls._DEFAULT_BROWSER_PROMPT is None:
+            cls._DEFAULT_BROWSER_PROMPT = DSL.JS_Page(
+                title= "Input Required",
+                description = "",
+                prompt = "",
+                form = True,
+                root= DSL.JS_Div(
+                    id = "new-input-div",
+                    children=[
+                        DSL.JS_TextBox(
+                            id = "generic_input",
+                            label = "Input",
+                            hint = "Input Required",
+                            type = "text",
+                            ),
+                        ]
+                    )
                 )
-            )
+        return cls._DEFAULT_BROWSER_PROMPT
 
     @classmethod
     def get_types(cls) -> list:
@@ -340,15 +534,109 @@ class ophelia_input():
         """
 
 
-        answer = None
-        if kwargs.get("prompt", None):
-            
-            if kwargs.get("opr", True):
-                answer = opr.input_from(name=kwargs.get("name", "Input"), message=kwargs["prompt"])
-            else:
-                answer = input(kwargs["prompt"] + ": ")
-        else:
-            answer = input("Input: ")
+        prompt = kwargs.get("prompt", None)
+        if not prompt:
+            return input("Input: ")
+        if kwargs.get("opr", True):
+            return _input_from(name=kwargs.get("name", "Input"), message=prompt)
+        return input(prompt + ": ")
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        """Reads exactly `size` bytes, raising ConnectionResetError if the peer closes first."""
+        buffer = bytearray()
+        while len(buffer) < size:
+            chunk = sock.recv(size - len(buffer))
+            if not chunk:
+                raise ConnectionResetError(f"HUD closed the connection after {len(buffer)} of {size} bytes")
+            buffer += chunk
+        return bytes(buffer)
+
+    @staticmethod
+    def _recv_json(sock: socket.socket, buffer: bytes) -> tuple[bytes, bool]:
+        """
+        Reads unframed JSON starting with `buffer` until it decodes, or until the peer closes.
+
+        A JSON object or array is never complete before its closing bracket, so the first
+        buffer that decodes is the whole answer and the connection can stay open.
+        """
+        buffer = bytearray(buffer)
+        while True:
+            try:
+                _loads(buffer)
+                return bytes(buffer), False
+            except ValueError:
+                pass
+            chunk = sock.recv(65536)
+            if not chunk:
+                return bytes(buffer), True
+            buffer += chunk
+
+    @classmethod
+    def _recv_answer(cls, sock: socket.socket) -> tuple[bytes, bool]:
+        """
+        Reads the HUD's answer: a 4-byte big-endian length followed by that many bytes of JSON.
+
+        A HUD that does not frame its answer sends raw JSON, which is recognised by its first
+        byte, as no sane length starts with "{" or "[". It is read until it decodes.
+
+        Returns
+        -------
+        tuple[bytes, bool]
+            The answer, and whether the HUD closed the connection after it.
+        """
+        first = cls._recv_exact(sock, 1)
+        if first in (b"{", b"["):
+            return cls._recv_json(sock, first)
+        size, = _U32_BE.unpack(first + cls._recv_exact(sock, _U32_BE.size - 1))
+        return cls._recv_exact(sock, size), False
+
+    @classmethod
+    def _get_hud_sock(cls) -> socket.socket:
+        """Returns the open HUD connection, connecting first if there is none."""
+        if cls._hud_sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(cls.HUD_TIMEOUT)
+                sock.connect((cls.HUD_HOST, cls.HUD_PORT))
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except BaseException:
+                sock.close()
+                raise
+            cls._hud_sock = sock
+        return cls._hud_sock
+
+    @classmethod
+    def _drop_hud_sock(cls):
+        if cls._hud_sock is not None:
+            cls._hud_sock.close()
+            cls._hud_sock = None
+
+    @classmethod
+    def _exchange(cls, frame: bytes) -> bytes:
+        """
+        Sends a frame over the kept HUD connection and returns the answer.
+
+        If a reused connection turns out to have been closed by the HUD, reconnects and tries
+        once more. On any other failure the connection is dropped, since its state is unknown.
+        """
+        reused = cls._hud_sock is not None
+        try:
+            sock = cls._get_hud_sock()
+            sock.sendall(frame)
+            answer, closed = cls._recv_answer(sock)
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            cls._drop_hud_sock()
+            if not reused:
+                raise
+            return cls._exchange(frame)
+        except BaseException:
+            cls._drop_hud_sock()
+            raise
+
+        if closed:
+            cls._drop_hud_sock()
         return answer
 
     @classmethod
@@ -370,27 +658,27 @@ class ophelia_input():
         """
 
         answer = {}
-        prompt = kwargs.get("prompt", cls.DEFAULT_BROWSER_PROMPT
-        )
+        prompt = kwargs.get("prompt") or cls.default_browser_prompt()
     
 
-        payload_json = json.dumps(prompt.serialize())
-        payload_bytes = payload_json.encode("utf-8")
-        payload_size = len(payload_bytes)
+        # Encoded once, retries resend the same frame
+        try:
+            payload_bytes = prompt.to_json_bytes()
+        except Exception as e:
+            opr.error_pretty(
+                exc=e,
+                name="Plugin Input",
+                message=f"Could not encode the prompt - {e}",
+            )
+            return answer
+        frame = _U32_BE.pack(len(payload_bytes)) + payload_bytes
 
 
         for attempt in range(1, 4):
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                    sock.settimeout(5*60)  # 5 minutes timeout
-                    sock.connect((cls.HUD_HOST, cls.HUD_PORT))
-                    size_packed = struct.pack("!I", payload_size)
-                    sock.sendall(size_packed + payload_bytes)
-
-                    answer_bytes = sock.recv(8192)
-                    answer_json = answer_bytes.decode("utf-8")
-                    answer = json.loads(answer_json)
-                    break
+                with cls._hud_lock:
+                    answer = _loads(cls._exchange(frame))
+                break
                 
             except (ConnectionRefusedError, ConnectionResetError) as e:
                 opr.error_pretty(
@@ -420,6 +708,13 @@ class ophelia_input():
 
         return answer
 
+    # Handler name per input type, looked up on the class so overrides of any kind are used
+    _DISPATCH = {
+        "console": "console_input",
+        "browser": "browser_input",
+        }
+    types = list(_DISPATCH)
+
     @classmethod
     def input(cls, input_type: str = "console", **kwargs):
         """
@@ -447,12 +742,9 @@ class ophelia_input():
 
         """
 
-        match input_type:
-            case "console":
-                return cls.console_input(**kwargs)
-            case "browser":
-                return cls.browser_input(**kwargs)
-            case _:
-                raise ValueError(f"Unhandled input type: {input_type}")
+        handler = cls._DISPATCH.get(input_type)
+        if handler is None:
+            raise ValueError(f"Unhandled input type: {input_type}")
+        return getattr(cls, handler)(**kwargs)
 
             
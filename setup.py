@@ -5,7 +5,12 @@ setup(
     version="1.0",
     packages=find_packages(),
     include_package_data=True,
-    python_requires=">=3.7",
+    zip_safe=True,
+    python_requires=">=3.10",
+    options={
+        # Ship bytecode in the build so the first import does not have to compile it
+        "build_py": {"compile": True, "optimize": 2},
+    },
     author="Opera von der Vollmer",
     description="An application usage monitor",
     url="https://github.com/OperavonderVollmer/PluginTemplate", 
@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PluginTemplate"))
+
+import DSL # Imported directly, the package pulls in OperaPowerRelay
+
+
+def test_shared_child_invalidates_every_parent():
+    label = DSL.JS_Label("shared", "before")
+    left = DSL.JS_Div("left", children=[label])
+    right = DSL.JS_Div("right", children=[label])
+    left.serialize()
+    right.to_json_bytes()
+
+    label.text = "after"
+    label.invalidate()
+
+    assert left.serialize()["children"][0]["props"]["text"] == "after"
+    assert b'"after"' in right.to_json_bytes()
+
+
+def test_lazy_rerenders_inside_container_after_update():
+    lazy = DSL.JS_Lazy(lambda text: DSL.JS_Label("inner", text), key="lazy", text="one")
+    root = DSL.JS_Div("root", children=[lazy])
+    assert root.serialize()["children"][0]["props"]["text"] == "one"
+
+    lazy.update(text="two")
+
+    child = root.serialize()["children"][0]
+    assert child["props"]["text"] == "two"
+    assert child["key"] == "lazy"
+
+
+def test_deep_add_after_serialize_invalidates_ancestors():
+    inner = DSL.JS_Div("inner")
+    middle = DSL.JS_Div("middle", children=[inner])
+    root = DSL.JS_Div("root", children=[middle])
+    root.serialize()
+    root.to_json_bytes()
+
+    inner.add(DSL.JS_Label("late", "added"))
+
+    assert root.serialize()["children"][0]["children"][0]["children"][0]["id"] == "late"
+    assert b'"late"' in root.to_json_bytes()
+
+
+def test_add_before_serialize_is_still_seen():
+    root = DSL.JS_Div("root")
+    root.add(DSL.JS_Label("first", "x"))
+    root.add_class("wide")
+    out = root.serialize()
+    assert [child["id"] for child in out["children"]] == ["first"]
+    assert out["classes"] == "wide"
+
+
+def test_flatten_lifts_serialized_trees_too():
+    def build():
+        return DSL.JS_Div("root", classes="outer", children=[
+            DSL.JS_Div("inner", children=[DSL.JS_Label("a", "x"), DSL.JS_TextBox("b", "y")]),
+            DSL.JS_Label("c", "z"),
+        ])
+
+    fresh, serialized = build(), build()
+    expected = serialized.serialize()
+
+    for root in (fresh, serialized):
+        flat = DSL.flatten(root)
+        assert DSL.serialize_flat(flat) == expected
+        assert flat.lift().serialize() == expected
+
+
+def test_render_reads_current_props_and_matches_after_invalidate():
+    label = DSL.JS_Label("lbl", "before")
+    page = DSL.JS_Page(title="t", prompt="", form=False, description="", root=DSL.JS_Div("root", children=[label]))
+    assert page.render() == page.to_json_bytes()
+
+    label.text = "changed"
+    assert b'"changed"' in page.render()
+    assert b'"changed"' not in page.to_json_bytes() # Cached until invalidated
+
+    label.invalidate()
+    assert page.render() == page.to_json_bytes()